@@ -5,14 +5,16 @@ Tracks discharge patterns and estimates time remaining.
 Learns from actual usage to improve accuracy over time.
 """
 
+import bisect
 import json
 import os
 import time
 import csv
+import queue
 import subprocess
 from pathlib import Path
 from collections import deque
-from threading import Lock
+from threading import Lock, Thread
 from datetime import datetime
 
 # Data storage location
@@ -21,6 +23,14 @@ HISTORY_FILE = DATA_DIR / "discharge_history.json"
 LEARNED_FILE = DATA_DIR / "learned_data.json"
 CSV_LOG_DIR = DATA_DIR / "logs"
 
+# CSV log buffering (avoid an SD card write every sample)
+CSV_BUFFER_SIZE = 64 * 1024
+CSV_FLUSH_ROWS = 12  # ~1 minute at 5s intervals
+CSV_FLUSH_INTERVAL = 60  # seconds
+CSV_QUEUE_SIZE = 512  # rows buffered for the writer thread
+CSV_BATCH_ROWS = 16  # max rows written per batch
+CSV_BATCH_WINDOW = 0.5  # seconds to wait for more rows before writing a batch
+
 # Battery configuration (3S Li-ion default, designed for Waveshare UPS 3S)
 NOMINAL_CAPACITY_MAH = 3400  # Adjust for your battery
 SHUNT_OHMS = 0.1  # Note: Not used - we read INA219 current register directly
@@ -79,6 +89,17 @@ class INA219DirectReader:
         """Read power in mW."""
         return self.voltage() * abs(self.current())
 
+    def read_all(self) -> tuple:
+        """
+        Read voltage (V), current (mA) and power (mW) together.
+
+        Two register reads instead of the four that voltage() + current() +
+        power() take, with power derived from the same voltage/current pair.
+        """
+        voltage = self.voltage()
+        current = self.current()
+        return voltage, current, voltage * abs(current)
+
     def close(self):
         """Close the I2C bus."""
         try:
@@ -130,6 +151,11 @@ DISCHARGE_CURVE = [
     (9.00, 0),
 ]
 
+# Ascending copies of the curve for bisect lookups.
+# Voltage and percent are both monotonic, so the same pair serves both directions.
+_VOLTS_ASC = [float(row[0]) for row in reversed(DISCHARGE_CURVE)]
+_PCTS_ASC = [float(row[1]) for row in reversed(DISCHARGE_CURVE)]
+
 # Voltage thresholds
 VOLT_MIN = 9.0
 VOLT_MAX = 12.6
@@ -138,7 +164,7 @@ VOLT_MAX = 12.6
 LOW_VOLTAGE_WARN = 10.2  # ~7%
 CRITICAL_VOLTAGE = 9.6  # ~2%
 
-# Notification thresholds (percent)
+# Notification thresholds (percent), must be in descending order
 WARN_THRESHOLDS = [20, 10, 5]
 CRITICAL_THRESHOLD = 5
 
@@ -147,6 +173,11 @@ CHARGE_CURRENT_THRESHOLD = 10  # mA - above this = charging
 CHARGE_VOLTAGE_SETTLED_TIME = 30  # seconds after unplug before trusting voltage
 POST_UNPLUG_GRACE_PERIOD = 300  # 5 minutes before blending toward voltage SOC
 
+# Sample-rate independent tuning: callers may sample every 2-30s
+AVERAGING_WINDOW = 300  # seconds of samples in the current/power averages
+DRIFT_BLEND = 0.002  # Pull toward voltage SOC per DRIFT_BLEND_PERIOD
+DRIFT_BLEND_PERIOD = 5  # seconds
+
 # Load compensation for voltage sag under load
 # Estimated internal resistance for 3S pack (~170mΩ per cell × 3 + wiring)
 INTERNAL_RESISTANCE_OHMS = 0.5
@@ -165,34 +196,97 @@ def load_compensated_voltage(measured_voltage: float, current_ma: float) -> floa
 
 def voltage_to_percent(voltage: float) -> float:
     """Convert voltage to percentage using Li-ion discharge curve."""
-    if voltage >= DISCHARGE_CURVE[0][0]:
+    if voltage >= _VOLTS_ASC[-1]:
         return 100.0
-    if voltage <= DISCHARGE_CURVE[-1][0]:
+    if voltage <= _VOLTS_ASC[0]:
         return 0.0
 
-    for i in range(len(DISCHARGE_CURVE) - 1):
-        v_high, p_high = DISCHARGE_CURVE[i]
-        v_low, p_low = DISCHARGE_CURVE[i + 1]
-        if v_low <= voltage <= v_high:
-            ratio = (voltage - v_low) / (v_high - v_low)
-            return p_low + ratio * (p_high - p_low)
-    return 0.0
+    i = bisect.bisect_right(_VOLTS_ASC, voltage)
+    v_low, v_high = _VOLTS_ASC[i - 1], _VOLTS_ASC[i]
+    p_low, p_high = _PCTS_ASC[i - 1], _PCTS_ASC[i]
+    return p_low + (voltage - v_low) / (v_high - v_low) * (p_high - p_low)
 
 
 def percent_to_voltage(percent: float) -> float:
     """Convert percentage to expected voltage (for calibration)."""
-    if percent >= 100:
-        return DISCHARGE_CURVE[0][0]
-    if percent <= 0:
-        return DISCHARGE_CURVE[-1][0]
+    if percent >= _PCTS_ASC[-1]:
+        return _VOLTS_ASC[-1]
+    if percent <= _PCTS_ASC[0]:
+        return _VOLTS_ASC[0]
+
+    i = bisect.bisect_right(_PCTS_ASC, percent)
+    p_low, p_high = _PCTS_ASC[i - 1], _PCTS_ASC[i]
+    v_low, v_high = _VOLTS_ASC[i - 1], _VOLTS_ASC[i]
+    return v_low + (percent - p_low) / (p_high - p_low) * (v_high - v_low)
+
+
+def _update_soc(
+    coulomb_soc: float,
+    voltage_soc: float,
+    voltage: float,
+    current_ma: float,
+    dt_hours: float,
+    capacity: float,
+    is_charging: bool,
+    voltage_settled: bool,
+    past_grace_period: bool,
+):
+    """
+    Advance the coulomb-counted SOC by one sample.
+
+    Pure function of its scalar arguments; the caller owns all state and
+    side effects.
 
-    for i in range(len(DISCHARGE_CURVE) - 1):
-        v_high, p_high = DISCHARGE_CURVE[i]
-        v_low, p_low = DISCHARGE_CURVE[i + 1]
-        if p_low <= percent <= p_high:
-            ratio = (percent - p_low) / (p_high - p_low)
-            return v_low + ratio * (v_high - v_low)
-    return VOLT_MIN
+    Returns:
+        Tuple of (new coulomb SOC, mAh discharged, whether full charge was
+        newly reached and the capacity learning cycle should run)
+    """
+    discharge_mah = 0.0
+    full_charge = False
+
+    # Coulomb counting: integrate current over time
+    if dt_hours > 0.0:
+        if is_charging:
+            charge_mah = abs(current_ma) * dt_hours
+            delta_soc = (charge_mah / capacity) * 100.0
+            coulomb_soc = min(100.0, coulomb_soc + delta_soc)
+        else:
+            discharge_mah = abs(current_ma) * dt_hours
+            delta_soc = (discharge_mah / capacity) * 100.0
+            coulomb_soc = max(0.0, coulomb_soc - delta_soc)
+
+    # === VOLTAGE CALIBRATION POINTS ===
+
+    # Calibrate at full charge using load-compensated voltage
+    compensated_v = load_compensated_voltage(voltage, current_ma)
+    if (
+        compensated_v >= 12.35
+        and abs(current_ma) < 150
+        and voltage_settled
+        and not is_charging
+    ):
+        if coulomb_soc < 95:
+            full_charge = True
+        coulomb_soc = 100.0
+
+    # Calibrate at empty
+    if voltage <= CRITICAL_VOLTAGE and not is_charging:
+        coulomb_soc = max(0.0, voltage_soc)
+
+    # Gradual drift correction (only after grace period)
+    if voltage_settled and not is_charging and past_grace_period and dt_hours > 0.0:
+        # 0.2% per DRIFT_BLEND_PERIOD, compounded over however long this sample spans
+        blend_factor = 1.0 - (1.0 - DRIFT_BLEND) ** (dt_hours * 3600.0 / DRIFT_BLEND_PERIOD)
+        coulomb_soc = coulomb_soc * (1 - blend_factor) + voltage_soc * blend_factor
+
+    # Clamp SOC based on voltage reality
+    if is_charging or not voltage_settled:
+        if voltage < 12.4:
+            coulomb_soc = min(coulomb_soc, 90.0)
+        if voltage < 12.0:
+            coulomb_soc = min(coulomb_soc, 80.0)
+
+    return coulomb_soc, discharge_mah, full_charge
 
 
 class BatteryLearning:
@@ -208,13 +302,16 @@ class BatteryLearning:
         self._lock = Lock()
         self._ensure_data_dir()
 
-        # Recent samples for averaging (last 60 samples = ~5 min at 5s intervals)
-        self._recent_current = deque(maxlen=60)
-        self._recent_power = deque(maxlen=60)
+        # Recent (time, current, power) samples for averaging (last AVERAGING_WINDOW)
+        self._recent = deque()
+        # Running sums of the deques above, updated as samples enter/leave
+        self._sum_current = 0.0
+        self._sum_power = 0.0
 
         # Hybrid SOC tracking
         self._coulomb_soc = None  # Coulomb-counted SOC (0-100)
         self._voltage_soc = None  # Voltage-based SOC for reference
+        self._soc_cache_voltage = None  # Voltage the cached voltage SOC was computed from
         self._last_sample_time = None
         self._last_voltage = None
         self._last_current = None
@@ -226,9 +323,13 @@ class BatteryLearning:
         self._last_charge_time = time.time() - POST_UNPLUG_GRACE_PERIOD  # Allow blending on boot
 
         # Notification tracking (don't repeat warnings)
-        self._warnings_sent = set()
+        self._next_warn_idx = 0  # Index into WARN_THRESHOLDS of the next warning
         self._last_warning_time = 0
 
+        # Periodic persistence of learned data
+        self._last_save_time = 0.0
+        self._sampled_since_save = False  # Anything new for close() to save
+
         # Session tracking for capacity learning
         self._session_start_time = time.time()
         self._session_start_soc = None
@@ -237,11 +338,23 @@ class BatteryLearning:
         # CSV logging
         self._csv_file = None
         self._csv_writer = None
+        self._csv_rows_since_flush = 0
+        self._last_flush_time = time.time()
+        self._csv_queue = queue.Queue(maxsize=CSV_QUEUE_SIZE)
+        self._writer_thread = None
         self._init_csv_logging()
+        if self._csv_writer:
+            self._writer_thread = Thread(target=self._writer_loop, name="csv-writer", daemon=True)
+            self._writer_thread.start()
 
         # Load learned data
         self._learned = self._load_learned_data()
 
+        # Hot-path copies of learned values (synced back in _save_learned_data)
+        self._capacity_mah = float(self._learned["effective_capacity_mah"])
+        self._avg_power_mw = self._learned["avg_power_mw"]
+        self._learned_dirty = False  # Set when _learned needs writing to disk
+
         # Initialize coulomb SOC from learned data if available
         if self._learned.get("last_soc") is not None:
             self._coulomb_soc = self._learned["last_soc"]
@@ -258,7 +371,7 @@ class BatteryLearning:
             csv_path = CSV_LOG_DIR / f"battery_{date_str}.csv"
             file_exists = csv_path.exists()
 
-            self._csv_file = open(csv_path, "a", newline="")
+            self._csv_file = open(csv_path, "a", newline="", buffering=CSV_BUFFER_SIZE)
             self._csv_writer = csv.writer(self._csv_file)
 
             if not file_exists:
@@ -280,26 +393,74 @@ class BatteryLearning:
             print(f"CSV logging init error: {e}")
             self._csv_writer = None
 
-    def _log_csv(self, voltage, current, power, v_soc, c_soc, h_soc, charging):
-        """Log a sample to CSV."""
-        if self._csv_writer:
+    def _log_csv(self, now, voltage, current, power, v_soc, c_soc, h_soc, charging):
+        """Queue a sample for the CSV writer thread."""
+        if self._writer_thread:
             try:
-                self._csv_writer.writerow(
-                    [
-                        datetime.now().isoformat(),
-                        f"{voltage:.3f}",
-                        f"{current:.1f}",
-                        f"{power:.1f}",
-                        f"{v_soc:.1f}",
-                        f"{c_soc:.1f}" if c_soc is not None else "",
-                        f"{h_soc:.1f}",
-                        "1" if charging else "0",
-                        f"{self._learned['effective_capacity_mah']:.0f}",
-                    ]
+                timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now))
+                # Rounded numbers are stringified by csv.writer in C, no per-field formatting
+                self._csv_queue.put_nowait(
+                    (
+                        f"{timestamp}.{int((now % 1) * 1000):03d}",
+                        round(voltage, 3),
+                        round(current, 1),
+                        round(power, 1),
+                        round(v_soc, 1),
+                        round(c_soc, 1) if c_soc is not None else "",
+                        round(h_soc, 1),
+                        1 if charging else 0,
+                        round(self._capacity_mah),
+                    )
                 )
+            except queue.Full:
+                pass  # Writer is stalled on disk I/O - drop the row rather than block
+
+    def _writer_loop(self):
+        """Write queued CSV rows in small batches (runs on the writer thread)."""
+        stopping = False
+        while not stopping:
+            row = self._csv_queue.get()
+            if row is None:
+                break
+
+            # Collect whatever else arrives shortly after, up to a batch
+            batch = [row]
+            deadline = time.monotonic() + CSV_BATCH_WINDOW
+            while len(batch) < CSV_BATCH_ROWS:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = self._csv_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            try:
+                self._csv_writer.writerows(batch)
+                self._csv_rows_since_flush += len(batch)
+                if (
+                    self._csv_rows_since_flush >= CSV_FLUSH_ROWS
+                    or time.time() - self._last_flush_time > CSV_FLUSH_INTERVAL
+                ):
+                    self._flush_csv()
+            except Exception:
+                pass
+
+        self._flush_csv()
+
+    def _flush_csv(self):
+        """Flush buffered CSV rows to disk."""
+        if self._csv_file:
+            try:
                 self._csv_file.flush()
             except Exception:
                 pass
+        self._csv_rows_since_flush = 0
+        self._last_flush_time = time.time()
 
     def _load_learned_data(self):
         """Load learned capacity and patterns from disk."""
@@ -326,62 +487,95 @@ class BatteryLearning:
             pass
         return default
 
-    def _save_learned_data(self):
-        """Save learned data to disk."""
+    def _save_learned_data(self, force: bool = False):
+        """Save learned data to disk if anything changed (or if forced)."""
         try:
-            if self._coulomb_soc is not None:
+            if self._capacity_mah != self._learned["effective_capacity_mah"]:
+                self._learned["effective_capacity_mah"] = self._capacity_mah
+                self._learned_dirty = True
+            if self._coulomb_soc is not None and self._coulomb_soc != self._learned["last_soc"]:
                 self._learned["last_soc"] = self._coulomb_soc
                 self._learned["last_soc_time"] = time.time()
-
-            with open(LEARNED_FILE, "w") as f:
-                json.dump(self._learned, f, indent=2)
+                self._learned_dirty = True
+
+            # Average power alone doesn't justify a write; it rides along with other changes
+            if not (self._learned_dirty or force):
+                return
+            self._learned["avg_power_mw"] = self._avg_power_mw
+
+            # Write to a temp file and rename so a crash can't leave a truncated file
+            tmp_file = LEARNED_FILE.with_suffix(".json.tmp")
+            with open(tmp_file, "w") as f:
+                json.dump(self._learned, f, separators=(",", ":"))
+            os.replace(tmp_file, LEARNED_FILE)
+            self._learned_dirty = False
+            self._sampled_since_save = False
         except Exception:
             pass
 
     def _send_notification(self, title, message, urgency="normal"):
         """Send a notification via notify-send (works with mako, dunst, etc.)."""
         try:
-            cmd = ["notify-send", "-u", urgency, title, message]
-            subprocess.run(cmd, timeout=5, capture_output=True)
+            # Fire and forget: no pipes, and never block the sampling path
+            subprocess.Popen(
+                ["notify-send", "-u", urgency, title, message],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                close_fds=True,
+            )
         except Exception:
             pass
 
     def _check_warnings(self, percent, charging):
         """Check if we need to send low battery warnings."""
         if charging:
-            self._warnings_sent.clear()
+            self._next_warn_idx = 0
+            return
+
+        idx = self._next_warn_idx
+        if idx >= len(WARN_THRESHOLDS) or percent > WARN_THRESHOLDS[idx]:
             return
 
         now = time.time()
         if now - self._last_warning_time < 60:
             return
 
-        for threshold in WARN_THRESHOLDS:
-            if percent <= threshold and threshold not in self._warnings_sent:
-                self._warnings_sent.add(threshold)
-                self._last_warning_time = now
+        threshold = WARN_THRESHOLDS[idx]
+        self._next_warn_idx = idx + 1
+        self._last_warning_time = now
 
-                if threshold <= CRITICAL_THRESHOLD:
-                    self._send_notification(
-                        "CRITICAL BATTERY",
-                        f"Battery at {percent:.0f}%! Shutdown imminent.",
-                        urgency="critical",
-                    )
-                elif threshold <= 10:
-                    self._send_notification(
-                        "Low Battery",
-                        f"Battery at {percent:.0f}%. Please connect charger.",
-                        urgency="critical",
-                    )
-                else:
-                    self._send_notification(
-                        "Battery Warning",
-                        f"Battery at {percent:.0f}%.",
-                        urgency="normal",
-                    )
-                break
+        if threshold <= CRITICAL_THRESHOLD:
+            self._send_notification(
+                "CRITICAL BATTERY",
+                f"Battery at {percent:.0f}%! Shutdown imminent.",
+                urgency="critical",
+            )
+        elif threshold <= 10:
+            self._send_notification(
+                "Low Battery",
+                f"Battery at {percent:.0f}%. Please connect charger.",
+                urgency="critical",
+            )
+        else:
+            self._send_notification(
+                "Battery Warning",
+                f"Battery at {percent:.0f}%.",
+                urgency="normal",
+            )
 
-    def record_sample(self, voltage: float, current_ma: float, power_mw: float) -> float:
+    def record_sample(
+        self,
+        voltage: float,
+        current_ma: float,
+        power_mw: float,
+        *,
+        _now=time.time,
+        _cct=CHARGE_CURRENT_THRESHOLD,
+        _cvst=CHARGE_VOLTAGE_SETTLED_TIME,
+        _grace=POST_UNPLUG_GRACE_PERIOD,
+        _to_percent=voltage_to_percent,
+        _update=_update_soc,
+    ) -> float:
         """
         Record a battery sample and update hybrid SOC.
 
@@ -390,38 +584,54 @@ class BatteryLearning:
             current_ma: Current in milliamps (positive = charging)
             power_mw: Power in milliwatts
 
+        The underscore keyword arguments bind module globals as fast locals
+        for this hot path; callers should not pass them.
+
         Returns:
             Current hybrid SOC percentage (0-100)
         """
         with self._lock:
-            now = time.time()
+            now = _now()
+            self._sampled_since_save = True
 
             # Determine charge state
             was_charging = self._is_charging
-            self._is_charging = current_ma > CHARGE_CURRENT_THRESHOLD
+            self._is_charging = current_ma > _cct
 
             # Track charge state changes for voltage settling
             if was_charging != self._is_charging:
                 self._charge_state_changed_time = now
                 self._voltage_settled = False
             elif self._charge_state_changed_time:
-                if now - self._charge_state_changed_time > CHARGE_VOLTAGE_SETTLED_TIME:
+                if now - self._charge_state_changed_time > _cvst:
                     self._voltage_settled = True
 
             # Track when we were last charging (for grace period after unplug)
             if self._is_charging:
                 self._last_charge_time = now
 
-            # Calculate voltage-based SOC
-            self._voltage_soc = voltage_to_percent(voltage)
+            # Calculate voltage-based SOC (reuse the last result if within 1 mV)
+            if (
+                self._soc_cache_voltage is None
+                or abs(voltage - self._soc_cache_voltage) >= 0.001
+            ):
+                self._voltage_soc = _to_percent(voltage)
+                self._soc_cache_voltage = voltage
 
             # Track current and power for averaging
-            self._recent_current.append(abs(current_ma))
-            self._recent_power.append(power_mw)
+            abs_current = abs(current_ma)
+            recent = self._recent
+            recent.append((now, abs_current, power_mw))
+            self._sum_current += abs_current
+            self._sum_power += power_mw
+            cutoff = now - AVERAGING_WINDOW
+            while recent[0][0] < cutoff:
+                _, old_current, old_power = recent.popleft()
+                self._sum_current -= old_current
+                self._sum_power -= old_power
 
             # Update average power
-            if self._recent_power:
-                self._learned["avg_power_mw"] = sum(self._recent_power) / len(self._recent_power)
+            self._avg_power_mw = self._sum_power / len(recent)
 
             # === HYBRID SOC CALCULATION ===
 
@@ -430,59 +640,30 @@ class BatteryLearning:
                 self._coulomb_soc = self._voltage_soc
                 self._session_start_soc = self._coulomb_soc
 
-            # Coulomb counting: integrate current over time
             if self._last_sample_time is not None:
                 dt_hours = (now - self._last_sample_time) / 3600.0
-                capacity = self._learned["effective_capacity_mah"]
-
-                if self._is_charging:
-                    charge_mah = abs(current_ma) * dt_hours
-                    delta_soc = (charge_mah / capacity) * 100.0
-                    self._coulomb_soc = min(100.0, self._coulomb_soc + delta_soc)
-                else:
-                    discharge_mah = abs(current_ma) * dt_hours
-                    delta_soc = (discharge_mah / capacity) * 100.0
-                    self._coulomb_soc = max(0.0, self._coulomb_soc - delta_soc)
-
-                    self._session_discharge_mah += discharge_mah
-                    self._learned["total_discharge_mah"] += discharge_mah
-
-            # === VOLTAGE CALIBRATION POINTS ===
-
-            # Calibrate at full charge using load-compensated voltage
-            compensated_v = load_compensated_voltage(voltage, current_ma)
-            if (
-                compensated_v >= 12.35
-                and abs(current_ma) < 150
-                and self._voltage_settled
-                and not self._is_charging
-            ):
-                if self._coulomb_soc < 95:
-                    self._on_full_charge()
-                self._coulomb_soc = 100.0
-
-            # Calibrate at empty
-            if voltage <= CRITICAL_VOLTAGE and not self._is_charging:
-                self._coulomb_soc = max(0.0, self._voltage_soc)
+            else:
+                dt_hours = 0.0
+
+            self._coulomb_soc, discharge_mah, full_charge = _update(
+                float(self._coulomb_soc),
+                float(self._voltage_soc),
+                float(voltage),
+                float(current_ma),
+                dt_hours,
+                self._capacity_mah,
+                self._is_charging,
+                self._voltage_settled,
+                now - self._last_charge_time > _grace,
+            )
 
-            # Gradual drift correction (only after grace period)
-            time_since_charge = now - self._last_charge_time
-            if (
-                self._voltage_settled
-                and not self._is_charging
-                and time_since_charge > POST_UNPLUG_GRACE_PERIOD
-            ):
-                blend_factor = 0.002  # 0.2% per sample (gentler than before)
-                self._coulomb_soc = (
-                    self._coulomb_soc * (1 - blend_factor) + self._voltage_soc * blend_factor
-                )
+            if discharge_mah:
+                self._session_discharge_mah += discharge_mah
+                self._learned["total_discharge_mah"] += discharge_mah
+                self._learned_dirty = True
 
-            # Clamp SOC based on voltage reality
-            if self._is_charging or not self._voltage_settled:
-                if voltage < 12.4:
-                    self._coulomb_soc = min(self._coulomb_soc, 90.0)
-                if voltage < 12.0:
-                    self._coulomb_soc = min(self._coulomb_soc, 80.0)
+            if full_charge:
+                self._on_full_charge()
 
             # Update tracking
             self._last_sample_time = now
@@ -496,6 +677,7 @@ class BatteryLearning:
 
             # Log to CSV
             self._log_csv(
+                now,
                 voltage,
                 current_ma,
                 power_mw,
@@ -506,8 +688,9 @@ class BatteryLearning:
             )
 
             # Periodically save
-            if int(now) % 30 == 0:
+            if now - self._last_save_time >= 30:
                 self._save_learned_data()
+                self._last_save_time = now
 
             return hybrid_soc
 
@@ -529,15 +712,29 @@ class BatteryLearning:
                         weighted_sum = sum(
                             c * w for c, w in zip(self._learned["capacity_samples"], weights)
                         )
-                        self._learned["effective_capacity_mah"] = weighted_sum / sum(weights)
+                        self._capacity_mah = weighted_sum / sum(weights)
 
             self._learned["cycle_count"] += 1
+            self._learned_dirty = True
             self._learned["last_full_charge_time"] = time.time()
             self._save_learned_data()
 
         self._session_discharge_mah = 0.0
         self._session_start_soc = 100.0
 
+    def resume(self, percent: float = None):
+        """
+        Restart coulomb counting after a gap in sampling.
+
+        The next sample starts a new integration interval instead of charging
+        the whole gap at its current. Optionally reseeds the SOC (e.g. from
+        another process that was sampling in the meantime).
+        """
+        with self._lock:
+            self._last_sample_time = None
+            if percent is not None:
+                self._coulomb_soc = max(0.0, min(100.0, percent))
+
     def get_hybrid_soc(self) -> float:
         """Get the current hybrid SOC."""
         with self._lock:
@@ -545,36 +742,45 @@ class BatteryLearning:
                 return max(0.0, min(100.0, self._coulomb_soc))
             return self._voltage_soc or 0.0
 
-    def get_time_remaining(self, percent: float, current_ma: float):
+    def _estimate_time(self, percent: float, current_ma: float):
         """
-        Estimate time remaining based on current draw and learned capacity.
+        Time to move `percent` of the learned capacity at the recent average draw.
+
+        Must be called with self._lock held.
 
         Returns:
             Tuple of (hours, minutes) or None if cannot estimate
         """
-        with self._lock:
-            if self._is_charging:
-                return None
+        if len(self._recent) >= 3:
+            avg_current = self._sum_current / len(self._recent)
+        else:
+            avg_current = abs(current_ma)
 
-            if self._recent_current and len(self._recent_current) >= 3:
-                avg_current = sum(self._recent_current) / len(self._recent_current)
-            else:
-                avg_current = abs(current_ma)
+        if avg_current < 30:
+            return None
 
-            if avg_current < 30:
-                return None
+        mah = (percent / 100.0) * self._capacity_mah
+        hours_needed = mah / avg_current
 
-            effective_capacity = self._learned["effective_capacity_mah"]
-            remaining_mah = (percent / 100.0) * effective_capacity
-            hours_remaining = remaining_mah / avg_current
+        if hours_needed < 0 or hours_needed > 50:
+            return None
 
-            if hours_remaining < 0 or hours_remaining > 50:
-                return None
+        hours = int(hours_needed)
+        minutes = int((hours_needed - hours) * 60)
+
+        return (hours, minutes)
 
-            hours = int(hours_remaining)
-            minutes = int((hours_remaining - hours) * 60)
+    def get_time_remaining(self, percent: float, current_ma: float):
+        """
+        Estimate time remaining based on current draw and learned capacity.
 
-            return (hours, minutes)
+        Returns:
+            Tuple of (hours, minutes) or None if cannot estimate
+        """
+        with self._lock:
+            if self._is_charging:
+                return None
+            return self._estimate_time(percent, current_ma)
 
     def get_time_to_full(self, percent: float, current_ma: float):
         """
@@ -586,26 +792,7 @@ class BatteryLearning:
         with self._lock:
             if not self._is_charging:
                 return None
-
-            if self._recent_current and len(self._recent_current) >= 3:
-                avg_current = sum(self._recent_current) / len(self._recent_current)
-            else:
-                avg_current = abs(current_ma)
-
-            if avg_current < 30:
-                return None
-
-            effective_capacity = self._learned["effective_capacity_mah"]
-            needed_mah = ((100.0 - percent) / 100.0) * effective_capacity
-            hours_to_full = needed_mah / avg_current
-
-            if hours_to_full < 0 or hours_to_full > 50:
-                return None
-
-            hours = int(hours_to_full)
-            minutes = int((hours_to_full - hours) * 60)
-
-            return (hours, minutes)
+            return self._estimate_time(100.0 - percent, current_ma)
 
     def format_time_remaining(self, percent: float, current_ma: float) -> str:
         """Get formatted string for time remaining/to full."""
@@ -630,9 +817,9 @@ class BatteryLearning:
         """Get learned statistics."""
         with self._lock:
             return {
-                "effective_capacity_mah": self._learned["effective_capacity_mah"],
+                "effective_capacity_mah": self._capacity_mah,
                 "cycle_count": self._learned["cycle_count"],
-                "avg_power_mw": self._learned["avg_power_mw"],
+                "avg_power_mw": self._avg_power_mw,
                 "nominal_capacity_mah": NOMINAL_CAPACITY_MAH,
                 "voltage_soc": self._voltage_soc,
                 "coulomb_soc": self._coulomb_soc,
@@ -648,9 +835,19 @@ class BatteryLearning:
 
     def close(self):
         """Clean up resources."""
-        self._save_learned_data()
+        # An instance with nothing new since its last save must not overwrite
+        # data another process (e.g. the tray) has saved since
+        if self._sampled_since_save:
+            self._save_learned_data(force=True)
+        if self._writer_thread:
+            try:
+                self._csv_queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self._writer_thread.join(timeout=5)
         if self._csv_file:
             try:
+                self._flush_csv()
                 self._csv_file.close()
             except Exception:
                 pass
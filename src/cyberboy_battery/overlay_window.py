@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Battery overlay window - the GTK side of the overlay.
+Imported by overlay.main() only once it knows the overlay is being opened,
+so toggling it off never loads GTK.
+"""
+
+import gi
+gi.require_version("Gtk", "3.0")
+gi.require_version("GtkLayerShell", "0.1")
+from gi.repository import Gtk, GtkLayerShell, Gdk, GLib
+import time
+
+from .shared_state import read_state_file, receive_latest, resubscribe, subscribe
+
+# Re-subscribe interval (covers tray restarts); reads the file if pushes stopped
+SAFETY_INTERVAL = 60  # seconds
+
+# Overlay styling
+MARGIN_TOP = 10
+MARGIN_RIGHT = 10
+
+# Label styles - updates swap a color class instead of re-parsing Pango markup
+OVERLAY_CSS = b"""
+.batt-percent { font-size: 18pt; font-weight: bold; }
+.batt-time { font-size: 9pt; color: #888888; }
+.batt-ok { color: #00ff00; }
+.batt-low { color: #ffff00; }
+.batt-crit { color: #ff0000; }
+.batt-charging { color: #00ffff; }
+.batt-unknown { color: #888888; }
+.batt-time.batt-unknown { color: #666666; }
+"""
+
+
+class BatteryOverlay(Gtk.Window):
+    """Transparent overlay window showing battery percentage."""
+
+    # Color classes: red, yellow, green, cyan (charging)
+    _TIERS = ("batt-crit", "batt-low", "batt-ok", "batt-charging")
+
+    def __init__(self):
+        super().__init__()
+
+        # Set up layer shell
+        GtkLayerShell.init_for_window(self)
+        GtkLayerShell.set_layer(self, GtkLayerShell.Layer.OVERLAY)
+        GtkLayerShell.set_anchor(self, GtkLayerShell.Edge.TOP, True)
+        GtkLayerShell.set_anchor(self, GtkLayerShell.Edge.RIGHT, True)
+        GtkLayerShell.set_margin(self, GtkLayerShell.Edge.TOP, MARGIN_TOP)
+        GtkLayerShell.set_margin(self, GtkLayerShell.Edge.RIGHT, MARGIN_RIGHT)
+        GtkLayerShell.set_exclusive_zone(self, 0)
+        GtkLayerShell.set_keyboard_mode(self, GtkLayerShell.KeyboardMode.NONE)
+
+        # Transparent background
+        self.set_app_paintable(True)
+        screen = self.get_screen()
+        visual = screen.get_rgba_visual()
+        if visual:
+            self.set_visual(visual)
+        self.connect("draw", self.on_draw)
+
+        # Container
+        self.box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
+        self.box.set_halign(Gtk.Align.END)
+        self.add(self.box)
+
+        # Styles for both labels, registered once for the whole screen
+        css = Gtk.CssProvider()
+        css.load_from_data(OVERLAY_CSS)
+        Gtk.StyleContext.add_provider_for_screen(
+            screen, css, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+        )
+
+        # Battery percentage label
+        self.label = Gtk.Label(label="--%")
+        self._current_tier = "batt-ok"
+        ctx = self.label.get_style_context()
+        ctx.add_class("batt-percent")
+        ctx.add_class(self._current_tier)
+        self.label.set_halign(Gtk.Align.END)
+        self.box.pack_start(self.label, False, False, 0)
+
+        # Time remaining label (smaller)
+        self.time_label = Gtk.Label()
+        self.time_label.get_style_context().add_class("batt-time")
+        self._time_tier = None
+        self.time_label.set_halign(Gtk.Align.END)
+        self.box.pack_start(self.time_label, False, False, 0)
+
+        # Last rendered texts/state, to skip redraws when nothing changed
+        self._last_pct_text = "--%"
+        self._last_time_text = ""
+        self._last_state = None
+
+        # Show the last known state, then render whatever the tray pushes
+        self.update()
+        self._last_push = time.monotonic()
+        self._sock = subscribe()
+        GLib.io_add_watch(
+            self._sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_state_pushed
+        )
+        GLib.timeout_add_seconds(SAFETY_INTERVAL, self.on_safety_tick)
+
+        self.show_all()
+
+    def on_draw(self, widget, cr):
+        """Draw transparent background."""
+        cr.set_source_rgba(0, 0, 0, 0)
+        cr.set_operator(1)  # CAIRO_OPERATOR_SOURCE
+        cr.paint()
+        return False
+
+    def on_state_pushed(self, fd, condition):
+        """Render the newest state datagram from the tray daemon."""
+        state = receive_latest(self._sock)
+        if state is not None:
+            self._last_push = time.monotonic()
+            self.render(state)
+        return True
+
+    def on_safety_tick(self):
+        """Re-subscribe in case the tray restarted; read the file if pushes stopped."""
+        resubscribe(self._sock)
+        if time.monotonic() - self._last_push > SAFETY_INTERVAL:
+            self.update()
+        return True
+
+    def _set_tier(self, tier):
+        """Swap the percentage label's color class if it changed."""
+        if tier != self._current_tier:
+            ctx = self.label.get_style_context()
+            ctx.remove_class(self._current_tier)
+            ctx.add_class(tier)
+            self._current_tier = tier
+
+    def _set_time_tier(self, tier):
+        """Swap the time label's color class if it changed (None = default gray)."""
+        if tier != self._time_tier:
+            ctx = self.time_label.get_style_context()
+            if self._time_tier:
+                ctx.remove_class(self._time_tier)
+            if tier:
+                ctx.add_class(tier)
+            self._time_tier = tier
+
+    def _set_text(self, pct_text: str, time_text: str):
+        """Set both label texts, skipping labels whose text is unchanged."""
+        if pct_text != self._last_pct_text:
+            self.label.set_text(pct_text)
+            self._last_pct_text = pct_text
+        if time_text != self._last_time_text:
+            self.time_label.set_text(time_text)
+            self._last_time_text = time_text
+
+    def get_tier(self, percent: float, charging: bool) -> str:
+        """Get color class based on battery level."""
+        return self._TIERS[3 if charging else 2 if percent > 50 else 1 if percent > 20 else 0]
+
+    def render(self, state: dict):
+        """Show a battery state dict (file or datagram layout)."""
+        percent = state.get("percent", 0)
+        charging = state.get("charging", False)
+        time_str = state.get("time_str", "")
+
+        # Nothing visible changed - skip formatting and widget calls entirely
+        # (the tier switches on the raw percent, so it's part of the key)
+        tier = self.get_tier(percent, charging)
+        key = (round(percent), charging, time_str, tier)
+        if key == self._last_state:
+            return
+        self._last_state = key
+
+        charge_indicator = " ⚡" if charging else ""
+
+        self._set_text(f"{percent:.0f}%{charge_indicator}", time_str)
+        self._set_tier(tier)
+        self._set_time_tier("batt-charging" if charging else None)
+
+    def update(self):
+        """Update display from shared state file."""
+        try:
+            self.render(read_state_file())
+
+        except FileNotFoundError:
+            self._last_state = None
+            self._set_text("--%", "No battery daemon")
+            self._set_tier("batt-unknown")
+            self._set_time_tier("batt-unknown")
+        except Exception:
+            self._last_state = None
+            self._set_text("ERR", "")
+            self._set_tier("batt-crit")
+
+        return True
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Shared battery state - how the tray daemon publishes readings to other UIs.
+
+Every update is packed into one fixed-size record. The tray writes it in
+place into a small file (for one-shot readers like status) and pushes it as a
+datagram to subscribers of a UNIX socket (for long-running readers like the
+overlay).
+"""
+
+import errno
+import os
+import socket
+import struct
+import time
+
+# Shared state file written by tray daemon (one packed record)
+BATTERY_STATE_FILE = "/tmp/cyberboy_battery_state.bin"
+
+# Datagram socket the tray daemon publishes updates on
+BATTERY_STATE_SOCKET = "/tmp/cyberboy_battery.sock"
+SUBSCRIBE_MESSAGE = b"subscribe"
+
+# Record layout: monotonic timestamp, percent, voltage, current (mA),
+# power (mW), charging, time string (UTF-8, NUL padded).
+# Percent and voltage are doubles so readers compare them against shutdown
+# thresholds exactly as measured (float32(9.6) > 9.6).
+STATE_STRUCT = struct.Struct("<dddff?24s")
+
+
+def read_state_file(path: str = BATTERY_STATE_FILE) -> dict:
+    """
+    Read the shared state file (a single pread of one record).
+
+    Raises FileNotFoundError if the file is missing or no record has been
+    written to it yet, so readers can treat both as "no battery daemon".
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        data = os.pread(fd, STATE_STRUCT.size, 0)
+    finally:
+        os.close(fd)
+    if len(data) < STATE_STRUCT.size or not any(data[:8]):  # Zero timestamp
+        raise FileNotFoundError(errno.ENOENT, "No battery state written yet", path)
+    return unpack_state(data)
+
+
+def pack_state(percent, voltage, current, power, charging, time_str) -> bytes:
+    """Pack a battery state into a record."""
+    return STATE_STRUCT.pack(
+        time.monotonic(),
+        percent,
+        voltage,
+        current,
+        power,
+        charging,
+        (time_str or "").encode(),  # struct truncates/pads to 24 bytes
+    )
+
+
+def unpack_state(data: bytes) -> dict:
+    """Unpack a record into a state dict."""
+    timestamp, percent, voltage, current, power, charging, time_str = STATE_STRUCT.unpack(data)
+    return {
+        "timestamp": timestamp,
+        "percent": percent,
+        "voltage": voltage,
+        "current": current,
+        "power": power,
+        "charging": charging,
+        "time_str": time_str.rstrip(b"\0").decode(errors="ignore"),
+    }
+
+
+class StateFileWriter:
+    """
+    Writer side of the state file (used by the tray daemon).
+
+    The record is overwritten in place with one pwrite on a descriptor kept
+    open for the daemon's lifetime - no temp file, rename or reopen per update.
+    The file is only created by the first write, so readers never see a
+    placeholder record, and it is recreated if deleted (e.g. /tmp cleanup).
+    """
+
+    def __init__(self, path: str = BATTERY_STATE_FILE):
+        self._path = path
+        self._fd = None
+
+    def write(self, data: bytes):
+        """Overwrite the record, (re)opening the path on first use or if unlinked."""
+        if self._fd is None or os.fstat(self._fd).st_nlink == 0:
+            self.close()
+            self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+            os.pwrite(self._fd, data, 0)
+            os.ftruncate(self._fd, len(data))  # Drop any longer leftover record
+            return
+        os.pwrite(self._fd, data, 0)
+
+    def close(self):
+        """Close the file descriptor."""
+        if self._fd is None:
+            return
+        try:
+            os.close(self._fd)
+        except Exception:
+            pass
+        self._fd = None
+
+
+class StatePublisher:
+    """
+    Server side of the state socket (used by the tray daemon).
+
+    Clients send SUBSCRIBE_MESSAGE from a bound socket; every later publish()
+    is sent to them until their socket goes away.
+    """
+
+    def __init__(self, path: str = BATTERY_STATE_SOCKET):
+        self._path = path
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(path)
+        self._sock.setblocking(False)
+        self._subscribers = set()
+        self._last = None
+
+    def fileno(self) -> int:
+        """File descriptor to watch for subscribe requests."""
+        return self._sock.fileno()
+
+    def handle_requests(self):
+        """Accept pending subscribe requests and send them the latest state."""
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(64)
+            except OSError:  # Includes BlockingIOError once drained
+                return
+            if data == SUBSCRIBE_MESSAGE and addr:
+                self._subscribers.add(addr)
+                if self._last is not None:
+                    self._send(self._last, addr)
+
+    def publish(self, data: bytes):
+        """Send a packed state to every subscriber."""
+        self._last = data
+        for addr in list(self._subscribers):
+            self._send(data, addr)
+
+    def _send(self, data: bytes, addr):
+        """Send to one subscriber, dropping it if its socket is gone."""
+        try:
+            self._sock.sendto(data, socket.MSG_DONTWAIT, addr)
+        except BlockingIOError:
+            pass  # Subscriber isn't keeping up - it will get the next one
+        except OSError:
+            self._subscribers.discard(addr)  # Subscriber went away
+
+    def close(self):
+        """Close the socket and remove its path."""
+        try:
+            self._sock.close()
+            os.unlink(self._path)
+        except Exception:
+            pass
+
+
+def subscribe(path: str = BATTERY_STATE_SOCKET) -> socket.socket:
+    """
+    Create a non-blocking socket subscribed to state updates.
+
+    The socket is autobound to an abstract address so the tray can reply.
+    Re-send the subscription with resubscribe() if the tray may have restarted.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind("")
+    sock.setblocking(False)
+    resubscribe(sock, path)
+    return sock
+
+
+def resubscribe(sock: socket.socket, path: str = BATTERY_STATE_SOCKET) -> bool:
+    """Send a subscribe request. Returns False if the tray isn't listening."""
+    try:
+        sock.sendto(SUBSCRIBE_MESSAGE, path)
+        return True
+    except OSError:
+        return False
+
+
+def receive_latest(sock: socket.socket):
+    """Drain pending datagrams and return the newest state dict (or None)."""
+    latest = None
+    while True:
+        try:
+            data = sock.recv(STATE_STRUCT.size)
+        except OSError:  # Includes BlockingIOError once drained
+            break
+        if len(data) == STATE_STRUCT.size:
+            latest = data
+    return unpack_state(latest) if latest is not None else None
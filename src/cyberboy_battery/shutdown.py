@@ -2,38 +2,160 @@
 """
 Battery Safe Shutdown Daemon.
 Monitors battery voltage and initiates safe shutdown at critical level.
+Uses the tray daemon's shared state; reads the sensor itself only without it.
 """
 
+import atexit
 import os
+import select
 import signal
 import subprocess
 import sys
 import time
 
 from .learning import (
-    get_battery_learning,
-    get_hybrid_soc,
+    BatteryLearning,
     get_ina219_reader,
     CRITICAL_VOLTAGE,
 )
+from .shared_state import read_state_file, receive_latest, resubscribe, subscribe
 
 # Configuration
 CHECK_INTERVAL = 10  # seconds between checks
 SHUTDOWN_VOLTAGE = 9.6  # Voltage threshold for shutdown
 SHUTDOWN_PERCENT = 3  # Percent threshold for shutdown
-CONSECUTIVE_LOW = 3  # Number of consecutive low readings before shutdown
+CONSECUTIVE_LOW = 3  # Checks' worth of sustained low readings before shutdown
+LOW_DURATION = CONSECUTIVE_LOW * CHECK_INTERVAL  # seconds, however often readings arrive
 WARN_BEFORE_SHUTDOWN = True
 
 PID_FILE = "/tmp/battery_shutdown.pid"
 
+# The tray daemon owns the I2C bus; read the sensor here only if its shared
+# state is missing or older than this (the tray polls at least every 30s)
+STATE_MAX_AGE = 90  # seconds
+
+
+def read_tray_state():
+    """Return the tray daemon's latest state, or None if missing or stale."""
+    try:
+        state = read_state_file()
+    except Exception:
+        return None
+    age = time.monotonic() - state["timestamp"]
+    # Negative: left over from an earlier boot (monotonic clock restarted)
+    if age < 0 or age > STATE_MAX_AGE:
+        return None
+    return state
+
+
+class BatterySource:
+    """
+    Battery readings for the shutdown daemon.
+
+    Prefers the tray daemon's shared state so only one process polls the I2C
+    bus, and falls back to reading the INA219 directly while it's unavailable.
+    The fallback keeps its own BatteryLearning only for as long as it's in use,
+    so it never saves a stale snapshot over the tray's learned data.
+    """
+
+    def __init__(self):
+        self._last_timestamp = None
+        self._tray_percent = None  # Last tray percent, until the sensor takes over
+        self._ina = None
+        self._learning = None
+        self._record_sample = None
+
+    def read(self, pushed: dict = None):
+        """
+        Get a new reading.
+
+        Args:
+            pushed: State dict just received from the tray's socket, or None
+                to read the shared state file
+
+        Returns:
+            Tuple of (voltage, percent, charging), or None if the tray hasn't
+            published anything since the last call
+        """
+        state = pushed if pushed is not None else read_tray_state()
+        if state is not None:
+            # Only evaluate each tray reading once
+            if state["timestamp"] == self._last_timestamp:
+                return None
+            self._last_timestamp = state["timestamp"]
+            self._tray_percent = state["percent"]
+            if self._learning is not None:
+                print("Tray state available - stopped reading INA219 directly")
+                self.close()
+            return state["voltage"], state["percent"], state["charging"]
+        return self._read_sensor()
+
+    def _read_sensor(self):
+        """Read the INA219 directly (set up on first use after tray state)."""
+        if self._learning is None:
+            print("No fresh tray state - reading INA219 directly")
+            self._ina = get_ina219_reader()
+            # Loads the learned data the tray saved while it was running
+            self._learning = BatteryLearning()
+            self._record_sample = self._learning.record_sample
+            if self._tray_percent is not None:
+                # Continue from the tray's latest SOC rather than its last save
+                self._learning.resume(self._tray_percent)
+                self._tray_percent = None
+
+        voltage, current, power = self._ina.read_all()
+
+        percent = self._record_sample(voltage, current, power)
+        return voltage, percent, self._learning.is_charging()
+
+    def close(self):
+        """Save and release the fallback's learning state, if any."""
+        if self._learning is not None:
+            self._learning.close()
+            self._learning = None
+            self._record_sample = None
+
+
+# libnotify module once initialized (False if it isn't available)
+_notify = None
+
+
+def _get_notify():
+    """Initialize libnotify via GObject introspection on first use."""
+    global _notify
+    if _notify is None:
+        try:
+            import gi
+            gi.require_version("Notify", "0.7")
+            from gi.repository import Notify
+            _notify = Notify if Notify.init("cyberboy_battery") else False
+        except (ImportError, ValueError):
+            _notify = False
+    return _notify
+
 
 def send_notification(title: str, message: str, urgency: str = "critical"):
-    """Send notification via notify-send."""
+    """Send notification via libnotify, falling back to notify-send."""
+    notify = _get_notify()
+    if notify:
+        try:
+            notification = notify.Notification.new(title, message)
+            notification.set_urgency({
+                "low": notify.Urgency.LOW,
+                "critical": notify.Urgency.CRITICAL,
+            }.get(urgency, notify.Urgency.NORMAL))
+            notification.show()
+            return
+        except Exception:
+            pass  # e.g. no notification daemon on the bus - try notify-send
+
     try:
-        subprocess.run(
+        # Fire and forget so a slow notifier never delays the shutdown check
+        subprocess.Popen(
             ["notify-send", "-u", urgency, title, message],
-            timeout=5,
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True,
         )
     except Exception:
         pass
@@ -87,6 +209,10 @@ def write_pid():
         f.write(str(os.getpid()))
 
 
+def _wake(*args):
+    """Signal handler - the signal is picked up from the wakeup fd instead."""
+
+
 def cleanup(*args):
     """Clean up on exit."""
     try:
@@ -102,67 +228,78 @@ def main():
         print("Battery shutdown daemon already running", file=sys.stderr)
         sys.exit(1)
 
-    signal.signal(signal.SIGTERM, cleanup)
-    signal.signal(signal.SIGINT, cleanup)
+    # Signals only write to a pipe the main loop selects on, so they're handled
+    # as soon as they arrive instead of after the current wait
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGTERM, _wake)
+    signal.signal(signal.SIGINT, _wake)
 
     write_pid()
     print(f"Battery shutdown daemon started (PID {os.getpid()})")
     print(f"Shutdown thresholds: {SHUTDOWN_VOLTAGE}V / {SHUTDOWN_PERCENT}%")
 
-    try:
-        ina = get_ina219_reader()
-    except Exception as e:
-        print(f"Error initializing INA219: {e}", file=sys.stderr)
-        cleanup()
-
-    learning = get_battery_learning()
+    source = BatterySource()
+    # cleanup() exits via sys.exit, so this also flushes logs on SIGTERM/SIGINT
+    atexit.register(source.close)
+    # Woken by the tray's updates; CHECK_INTERVAL is only the longest wait
+    sock = subscribe()
 
-    low_count = 0
+    low_since = None  # Monotonic time of the first reading in the current low spell
     warned = False
 
     while True:
-        try:
-            voltage = ina.voltage()
-            current = ina.current()
-            power = ina.power()
+        ready, _, _ = select.select([sock, wakeup_r], [], [], CHECK_INTERVAL)
+        if wakeup_r in ready:
+            os.read(wakeup_r, 64)
+            cleanup()
 
-            percent = get_hybrid_soc(voltage, current, power)
-            charging = learning.is_charging()
+        try:
+            if sock in ready:
+                reading = source.read(receive_latest(sock))
+            else:
+                resubscribe(sock)  # In case the tray restarted
+                reading = source.read()
+            if reading is None:
+                continue
+            voltage, percent, charging = reading
 
             if not charging:
                 if voltage <= SHUTDOWN_VOLTAGE or percent <= SHUTDOWN_PERCENT:
-                    low_count += 1
+                    now = time.monotonic()
+                    if low_since is None:
+                        low_since = now
+                    low_for = now - low_since
                     print(
                         f"Low battery detected: {voltage:.2f}V / {percent:.0f}% "
-                        f"(count: {low_count}/{CONSECUTIVE_LOW})"
+                        f"(low for {low_for:.0f}/{LOW_DURATION}s)"
                     )
 
-                    if low_count == 1 and WARN_BEFORE_SHUTDOWN and not warned:
+                    if WARN_BEFORE_SHUTDOWN and not warned:
                         send_notification(
                             "CRITICAL BATTERY",
-                            f"Battery at {percent:.0f}%! "
-                            f"Shutdown in ~{CONSECUTIVE_LOW * CHECK_INTERVAL}s",
+                            f"Battery at {percent:.0f}%! Shutdown in ~{LOW_DURATION}s",
                             urgency="critical",
                         )
                         warned = True
 
-                    if low_count >= CONSECUTIVE_LOW:
+                    if low_for >= LOW_DURATION:
                         safe_shutdown()
                         break
                 else:
-                    if low_count > 0:
+                    if low_since is not None:
                         print(f"Battery recovered: {voltage:.2f}V / {percent:.0f}%")
-                    low_count = 0
+                    low_since = None
                     warned = False
             else:
-                low_count = 0
+                low_since = None
                 warned = False
 
         except Exception as e:
             print(f"Error reading battery: {e}", file=sys.stderr)
 
-        time.sleep(CHECK_INTERVAL)
-
 
 if __name__ == "__main__":
     main()
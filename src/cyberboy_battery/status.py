@@ -6,17 +6,14 @@ Reads state from tray daemon via shared file.
 """
 
 import sys
-import json
 
-# Shared state file written by tray daemon
-BATTERY_STATE_FILE = "/tmp/cyberboy_battery_state.json"
+from .shared_state import read_state_file
 
 
 def main():
     """Entry point for battery status output."""
     try:
-        with open(BATTERY_STATE_FILE, "r") as f:
-            state = json.load(f)
+        state = read_state_file()
 
         percent = state.get("percent", 0)
         charging = state.get("charging", False)
@@ -10,25 +10,52 @@ gi.require_version("Gtk", "3.0")
 gi.require_version("AyatanaAppIndicator3", "0.1")
 from gi.repository import Gtk, AyatanaAppIndicator3, GLib
 
-import json
-import os
+import signal
+import time
+from threading import Event, Thread
 
 from .learning import (
     get_battery_learning,
-    get_hybrid_soc,
     get_ina219_reader,
     NOMINAL_CAPACITY_MAH,
     LOW_VOLTAGE_WARN,
     CRITICAL_VOLTAGE,
 )
+from .shared_state import StateFileWriter, StatePublisher, pack_state
 
-# Shared state file for other UIs (overlay, status) to read
-BATTERY_STATE_FILE = "/tmp/cyberboy_battery_state.json"
+# Adaptive polling (sensor thread): back off while readings are steady,
+# tighten on change
+UPDATE_INTERVAL_MIN = 5  # seconds
+UPDATE_INTERVAL_MAX = 30  # seconds
+UPDATE_INTERVAL_MENU = 2  # seconds, while the menu is open
+ACTIVE_PERIOD = 60  # seconds of fast polling after charge state or SOC changes
+STEADY_VOLTAGE_DELTA = 0.02  # V
+STEADY_CURRENT_DELTA = 30  # mA
+STEADY_PERCENT_DELTA = 1  # %
+
+# Menu labels are only refreshed while the menu is open, but at least this
+# often in case the indicator host never reports the menu being shown
+MENU_REFRESH_INTERVAL = 60  # seconds
+
+# Learned stats barely move between ticks; reuse them for a while
+STATS_CACHE_TTL = 30  # seconds
 
 
 class UPSIndicator:
     """System tray indicator showing battery status."""
 
+    # Icon names by (level bucket, charging), from empty (0) to full (3)
+    _ICONS = {
+        (0, False): "battery-empty",
+        (1, False): "battery-low",
+        (2, False): "battery-good",
+        (3, False): "battery-full",
+        (0, True): "battery-empty-charging",
+        (1, True): "battery-low-charging",
+        (2, True): "battery-good-charging",
+        (3, True): "battery-full-charging",
+    }
+
     def __init__(self):
         self.indicator = AyatanaAppIndicator3.Indicator.new(
             "ups-battery", "battery-good", AyatanaAppIndicator3.IndicatorCategory.HARDWARE
@@ -37,11 +64,47 @@ class UPSIndicator:
         self.indicator.set_title("Battery: --%")
 
         self.learning = get_battery_learning()
+        # Bound once so each tick skips the get_hybrid_soc singleton lookup
+        self._record_sample = self.learning.record_sample
         self._build_menu()
         self._init_ina219()
-
-        GLib.timeout_add_seconds(5, self.update)
-        self.update()
+        self._init_publisher()
+
+        # Polling cadence and the reading it was last reset at
+        self._interval = UPDATE_INTERVAL_MIN
+        self._active_until = 0.0
+        self._ref_voltage = None
+        self._ref_current = None
+        self._ref_percent = None
+        self._ref_charging = None
+        self._menu_open = False
+
+        # Last shown indicator/menu values, to skip redundant widget calls
+        self._display_key = None
+        self._menu_key = None
+
+        # Menu contents computed while the menu was closed
+        self._pending_menu_state = None
+        self._menu_updated_time = 0.0
+
+        # Cached learning results and the inputs they were computed for
+        self._stats_cache = None
+        self._stats_cache_time = 0.0
+        self._stats_percent = None
+        self._stats_charging = None
+        self._time_str_cache = None
+        self._time_str_key = None
+
+        # Sensor thread and its latest (voltage, current, power, percent, charging)
+        self._latest = None
+        self._wake = Event()
+        self._stop = Event()
+        self._sampler = None
+        if self.ina_ok:
+            self._sampler = Thread(target=self._sampler_loop, daemon=True)
+            self._sampler.start()
+        else:
+            self._show_error()
 
     def _build_menu(self):
         """Build the indicator menu."""
@@ -96,6 +159,8 @@ class UPSIndicator:
         self.menu.append(quit_item)
 
         self.menu.show_all()
+        self.menu.connect("show", self._on_menu_show)
+        self.menu.connect("hide", self._on_menu_hide)
         self.indicator.set_menu(self.menu)
 
     def _init_ina219(self):
@@ -107,52 +172,151 @@ class UPSIndicator:
             print(f"INA219 init error: {e}")
             self.ina_ok = False
 
+    def _init_publisher(self):
+        """Open the state file and socket that share updates with other UIs."""
+        self._state_file = StateFileWriter()
+
+        try:
+            self._publisher = StatePublisher()
+            GLib.io_add_watch(
+                self._publisher.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self._on_subscribe
+            )
+        except OSError as e:
+            print(f"State socket error: {e}")
+            self._publisher = None
+
+    def _on_subscribe(self, fd, condition) -> bool:
+        """Handle subscribe requests arriving on the state socket."""
+        self._publisher.handle_requests()
+        return True
+
     def get_battery_icon(self, percent: float, charging: bool) -> str:
         """Get appropriate battery icon name."""
         if percent >= 80:
-            level = "full"
+            bucket = 3
         elif percent >= 50:
-            level = "good"
+            bucket = 2
         elif percent >= 20:
-            level = "low"
+            bucket = 1
         else:
-            level = "empty"
+            bucket = 0
+        return self._ICONS[(bucket, charging)]
+
+    def _sampler_loop(self):
+        """
+        Read the sensor and feed the learning model on a background thread.
+
+        A slow or stalled I2C bus only delays this thread; each sample is
+        handed to update() on the GLib main loop via idle_add.
+        """
+        while not self._stop.is_set():
+            try:
+                voltage, current, power = self.ina.read_all()
+                percent = self._record_sample(voltage, current, power)
+                charging = self.learning.is_charging()
+                # Single reference assignment - update() never sees a torn sample
+                self._latest = (voltage, current, power, percent, charging)
+                self._adapt_interval(voltage, current, percent, charging)
+            except Exception as e:
+                print(f"Sensor read error: {e}")
+                self._latest = None
+            GLib.idle_add(self.update)
+
+            interval = UPDATE_INTERVAL_MENU if self._menu_open else self._interval
+            if self._wake.wait(interval):
+                self._wake.clear()
+
+    def _on_menu_show(self, menu):
+        """Refresh now and poll quickly while the menu is open."""
+        self._menu_open = True
+        if self._pending_menu_state:
+            self._update_menu(*self._pending_menu_state)
+        self._wake.set()
+
+    def _on_menu_hide(self, menu):
+        """Return to the adaptive interval after the next sample."""
+        self._menu_open = False
+
+    def _get_stats_cached(self, percent: float, charging: bool) -> dict:
+        """Return learning stats, recomputed after STATS_CACHE_TTL or on SOC/charge change."""
+        now = time.monotonic()
+        if (
+            self._stats_cache is None
+            or self._menu_open
+            or now - self._stats_cache_time >= STATS_CACHE_TTL
+            or abs(percent - self._stats_percent) >= 1
+            or charging != self._stats_charging
+        ):
+            self._stats_cache = self.learning.get_stats()
+            self._stats_cache_time = now
+            self._stats_percent = percent
+            self._stats_charging = charging
+        return self._stats_cache
+
+    def _get_time_str_cached(self, percent: float, current: float, charging: bool) -> str:
+        """Return the time remaining string, recomputed only when its inputs change."""
+        key = (int(percent), charging, int(abs(current) // 50))
+        if key != self._time_str_key:
+            self._time_str_cache = self.learning.format_time_remaining(percent, current)
+            self._time_str_key = key
+        return self._time_str_cache
+
+    def _adapt_interval(self, voltage: float, current: float, percent: float, charging: bool):
+        """
+        Pick the next polling interval.
+
+        Polls every UPDATE_INTERVAL_MIN for ACTIVE_PERIOD after the charge state
+        flips or SOC moves, or whenever voltage/current move; otherwise doubles
+        the interval up to UPDATE_INTERVAL_MAX.
+        """
+        now = time.monotonic()
+        if (
+            self._ref_percent is None
+            or charging != self._ref_charging
+            or abs(percent - self._ref_percent) >= STEADY_PERCENT_DELTA
+        ):
+            self._active_until = now + ACTIVE_PERIOD
+            self._ref_percent = percent
+            self._ref_charging = charging
+
+        moved = (
+            self._ref_voltage is None
+            or abs(voltage - self._ref_voltage) >= STEADY_VOLTAGE_DELTA
+            or abs(current - self._ref_current) >= STEADY_CURRENT_DELTA
+        )
+        if moved:
+            self._ref_voltage = voltage
+            self._ref_current = current
 
-        if charging:
-            return f"battery-{level}-charging"
-        return f"battery-{level}"
+        if moved or now < self._active_until:
+            self._interval = UPDATE_INTERVAL_MIN
+        else:
+            self._interval = min(self._interval * 2, UPDATE_INTERVAL_MAX)
 
     def _write_shared_state(self, percent, voltage, current, power, charging, time_str):
-        """Write battery state to shared file for other UIs to read."""
+        """Publish battery state to subscribers and the shared file."""
+        data = pack_state(percent, voltage, current, power, charging, time_str)
+
+        if self._publisher:
+            self._publisher.publish(data)
+
         try:
-            state = {
-                "percent": percent,
-                "voltage": voltage,
-                "current": current,
-                "power": power,
-                "charging": charging,
-                "time_str": time_str or "",
-            }
-            tmp_file = BATTERY_STATE_FILE + ".tmp"
-            with open(tmp_file, "w") as f:
-                json.dump(state, f)
-            os.rename(tmp_file, BATTERY_STATE_FILE)
+            self._state_file.write(data)
         except Exception:
             pass
 
     def update(self) -> bool:
-        """Update the indicator with current battery status."""
-        if not self.ina_ok:
-            self.indicator.set_label("ERR", "")
-            return True
+        """Update the indicator with the latest sample (runs on the GLib main loop)."""
+        latest = self._latest
+        if latest is None:
+            self._show_error()
+            return False
 
         try:
-            voltage = self.ina.voltage()
-            current = self.ina.current()
-            power = self.ina.power()
-
-            percent = get_hybrid_soc(voltage, current, power)
-            charging = self.learning.is_charging()
+            voltage, current, power, percent, charging = latest
+            # Displayed forms, formatted once per tick
+            pct = int(percent + 0.5)
+            voltage_str = f"{voltage:.2f} V"
 
             # Update icon
             if voltage <= CRITICAL_VOLTAGE and not charging:
@@ -162,59 +326,97 @@ class UPSIndicator:
             else:
                 icon = self.get_battery_icon(percent, charging)
 
-            self.indicator.set_icon_full(icon, f"Battery {percent:.0f}%")
-            self.indicator.set_label(f"{percent:.0f}%", "")
-            self.indicator.set_title(f"Battery {percent:.0f}%")
-
-            # Update menu items
-            self.percent_item.set_label(f"Battery: {percent:.0f}%")
-            self.voltage_item.set_label(f"Voltage: {voltage:.2f} V")
-            self.current_item.set_label(f"Current: {current:.1f} mA")
-            self.power_item.set_label(f"Power: {power:.1f} mW")
-
-            # Update SOC comparison
-            stats = self.learning.get_stats()
-            v_soc = stats.get("voltage_soc")
-            c_soc = stats.get("coulomb_soc")
-            if v_soc is not None:
-                self.vsoc_item.set_label(f"Voltage SOC: {v_soc:.1f}%")
-            if c_soc is not None:
-                self.csoc_item.set_label(f"Coulomb SOC: {c_soc:.1f}%")
-
-            # Update time remaining
-            time_str = self.learning.format_time_remaining(percent, current)
-            if time_str:
-                self.time_item.set_label(f"Time: {time_str}")
-            elif charging:
-                self.time_item.set_label("Time: Charging...")
-            else:
-                self.time_item.set_label("Time: Calculating...")
-
-            # Update learned stats
-            self.capacity_item.set_label(
-                f"Capacity: {stats['effective_capacity_mah']:.0f} mAh "
-                f"(nom: {stats['nominal_capacity_mah']})"
-            )
-            self.cycles_item.set_label(f"Cycles tracked: {stats['cycle_count']}")
+            # Skip the indicator calls (and the icon theme lookup) if nothing shown changed
+            display_key = (icon, pct, charging)
+            if display_key != self._display_key:
+                self._display_key = display_key
+                title = f"Battery {pct}%"
+                self.indicator.set_icon_full(icon, title)
+                self.indicator.set_label(f"{pct}%", "")
+                self.indicator.set_title(title)
+
+            time_str = self._get_time_str_cached(percent, current, charging)
+
+            # Update menu items (deferred while the menu is closed)
+            menu_key = (pct, voltage_str, int(current), int(power), charging, time_str)
+            if self._menu_open or menu_key != self._menu_key:
+                self._menu_key = menu_key
+                stats = self._get_stats_cached(percent, charging)
+                self._pending_menu_state = (
+                    pct, voltage_str, current, power, charging, time_str, stats
+                )
+            if self._pending_menu_state and (
+                self._menu_open
+                or time.monotonic() - self._menu_updated_time >= MENU_REFRESH_INTERVAL
+            ):
+                self._update_menu(*self._pending_menu_state)
 
             # Write state to shared file for other UIs
             self._write_shared_state(percent, voltage, current, power, charging, time_str)
 
         except Exception as e:
             print(f"Update error: {e}")
-            self.indicator.set_label("ERR", "")
+            self._show_error()
+
+        return False  # One-shot idle callback
+
+    def _show_error(self):
+        """Show ERR on the indicator (and redraw normally once readings resume)."""
+        self._display_key = None
+        self.indicator.set_label("ERR", "")
+
+    def _update_menu(self, pct, voltage_str, current, power, charging, time_str, stats):
+        """Set the menu item labels."""
+        self._pending_menu_state = None
+        self._menu_updated_time = time.monotonic()
+
+        self.percent_item.set_label(f"Battery: {pct}%")
+        self.voltage_item.set_label(f"Voltage: {voltage_str}")
+        self.current_item.set_label(f"Current: {current:.1f} mA")
+        self.power_item.set_label(f"Power: {power:.1f} mW")
+
+        # Update SOC comparison
+        v_soc = stats.get("voltage_soc")
+        c_soc = stats.get("coulomb_soc")
+        if v_soc is not None:
+            self.vsoc_item.set_label(f"Voltage SOC: {v_soc:.1f}%")
+        if c_soc is not None:
+            self.csoc_item.set_label(f"Coulomb SOC: {c_soc:.1f}%")
+
+        # Update time remaining
+        if time_str:
+            self.time_item.set_label(f"Time: {time_str}")
+        elif charging:
+            self.time_item.set_label("Time: Charging...")
+        else:
+            self.time_item.set_label("Time: Calculating...")
 
-        return True
+        # Update learned stats
+        self.capacity_item.set_label(
+            f"Capacity: {stats['effective_capacity_mah']:.0f} mAh "
+            f"(nom: {stats['nominal_capacity_mah']})"
+        )
+        self.cycles_item.set_label(f"Cycles tracked: {stats['cycle_count']}")
 
     def quit(self, widget):
         """Clean up and quit."""
+        self._stop.set()
+        self._wake.set()
+        if self._sampler:
+            # Bounded - a stuck I2C read mustn't hang shutdown (thread is a daemon)
+            self._sampler.join(timeout=2)
         self.learning.close()
+        if self._publisher:
+            self._publisher.close()
+        self._state_file.close()
         Gtk.main_quit()
 
 
 def main():
     """Entry point for the tray indicator."""
     indicator = UPSIndicator()
+    # Flush logs and learned data on SIGTERM (e.g. session logout)
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, indicator.quit, None)
     Gtk.main()
 
 
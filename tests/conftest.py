@@ -0,0 +1,16 @@
+"""Shared fixtures."""
+
+import pytest
+
+from cyberboy_battery import learning
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point BatteryLearning's data files at a temporary directory."""
+    monkeypatch.setattr(learning, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(learning, "HISTORY_FILE", tmp_path / "discharge_history.json")
+    monkeypatch.setattr(learning, "LEARNED_FILE", tmp_path / "learned_data.json")
+    monkeypatch.setattr(learning, "CSV_LOG_DIR", tmp_path / "logs")
+    monkeypatch.setattr(learning.BatteryLearning, "_send_notification", lambda *args, **kw: None)
+    return tmp_path
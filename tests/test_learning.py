@@ -0,0 +1,19 @@
+"""Tests for BatteryLearning persistence."""
+
+import json
+
+from cyberboy_battery.learning import BatteryLearning
+
+
+def test_close_without_samples_keeps_saved_data(data_dir):
+    """An instance with nothing new must not overwrite what another process saved."""
+    idle = BatteryLearning()
+
+    active = BatteryLearning()
+    active.record_sample(11.4, -800.0, 11.4 * 800.0)
+    active.close()
+    saved = (data_dir / "learned_data.json").read_text()
+
+    idle.close()
+    assert (data_dir / "learned_data.json").read_text() == saved
+    assert json.loads(saved)["last_soc"] is not None
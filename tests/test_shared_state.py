@@ -0,0 +1,103 @@
+"""Tests for the tray's shared state record, file and socket."""
+
+import os
+import time
+
+import pytest
+
+from cyberboy_battery.shared_state import (
+    STATE_STRUCT,
+    StateFileWriter,
+    StatePublisher,
+    pack_state,
+    read_state_file,
+    receive_latest,
+    subscribe,
+    unpack_state,
+)
+
+
+def test_pack_roundtrip():
+    state = unpack_state(pack_state(42.5, 11.84, -512.3, 6060.0, True, "3h 5m remaining"))
+    assert state["percent"] == 42.5
+    assert state["voltage"] == 11.84
+    assert state["current"] == pytest.approx(-512.3, abs=0.01)
+    assert state["power"] == pytest.approx(6060.0)
+    assert state["charging"] is True
+    assert state["time_str"] == "3h 5m remaining"
+    assert 0 < time.monotonic() - state["timestamp"] < 5
+
+
+def test_voltage_compares_exactly():
+    # The shutdown daemon checks voltage <= 9.6; float32 would round 9.6 up
+    state = unpack_state(pack_state(2.0, 9.6, -800.0, 7680.0, False, ""))
+    assert state["voltage"] <= 9.6
+
+
+def test_long_time_str_truncated():
+    state = unpack_state(pack_state(50.0, 11.5, 0.0, 0.0, False, "x" * 40))
+    assert state["time_str"] == "x" * 24
+
+
+def test_writer_creates_file_on_first_write(tmp_path):
+    path = str(tmp_path / "state.bin")
+    writer = StateFileWriter(path)
+    try:
+        assert not os.path.exists(path)
+        writer.write(pack_state(50.0, 11.5, -400.0, 4600.0, False, "5h"))
+        assert read_state_file(path)["percent"] == 50.0
+        writer.write(pack_state(49.0, 11.5, -400.0, 4600.0, False, "5h"))
+        assert read_state_file(path)["percent"] == 49.0
+    finally:
+        writer.close()
+
+
+def test_writer_recreates_deleted_file(tmp_path):
+    path = str(tmp_path / "state.bin")
+    writer = StateFileWriter(path)
+    try:
+        writer.write(pack_state(50.0, 11.5, -400.0, 4600.0, False, ""))
+        os.unlink(path)
+        writer.write(pack_state(48.0, 11.5, -400.0, 4600.0, False, ""))
+        assert read_state_file(path)["percent"] == 48.0
+    finally:
+        writer.close()
+
+
+@pytest.mark.parametrize("data", [b"", bytes(STATE_STRUCT.size)])
+def test_read_without_record_is_missing(tmp_path, data):
+    path = tmp_path / "state.bin"
+    path.write_bytes(data)
+    with pytest.raises(FileNotFoundError):
+        read_state_file(str(path))
+
+
+def test_publish_to_subscriber(tmp_path):
+    path = str(tmp_path / "state.sock")
+    publisher = StatePublisher(path)
+    sock = subscribe(path)
+    try:
+        publisher.handle_requests()
+        publisher.publish(pack_state(60.0, 11.9, -300.0, 3570.0, False, ""))
+        publisher.publish(pack_state(59.0, 11.9, -300.0, 3570.0, False, ""))
+        time.sleep(0.05)
+        assert receive_latest(sock)["percent"] == 59.0
+        assert receive_latest(sock) is None
+    finally:
+        sock.close()
+        publisher.close()
+    assert not os.path.exists(path)
+
+
+def test_new_subscriber_gets_last_state(tmp_path):
+    path = str(tmp_path / "state.sock")
+    publisher = StatePublisher(path)
+    publisher.publish(pack_state(70.0, 12.0, -300.0, 3600.0, False, ""))
+    sock = subscribe(path)
+    try:
+        publisher.handle_requests()
+        time.sleep(0.05)
+        assert receive_latest(sock)["percent"] == 70.0
+    finally:
+        sock.close()
+        publisher.close()
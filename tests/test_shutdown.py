@@ -0,0 +1,135 @@
+"""Tests for the shutdown daemon's battery source."""
+
+import json
+import time
+
+import pytest
+
+from cyberboy_battery import shutdown
+from cyberboy_battery.learning import BatteryLearning
+
+
+def tray_state(percent=45.0, voltage=11.4, charging=False, age=0.0):
+    """A state dict as read from the tray's shared file."""
+    return {
+        "timestamp": time.monotonic() - age,
+        "percent": percent,
+        "voltage": voltage,
+        "current": -800.0,
+        "power": voltage * 800.0,
+        "charging": charging,
+        "time_str": "",
+    }
+
+
+def test_read_tray_state_fresh(monkeypatch):
+    state = tray_state()
+    monkeypatch.setattr(shutdown, "read_state_file", lambda: state)
+    assert shutdown.read_tray_state() is state
+
+
+@pytest.mark.parametrize("age", [shutdown.STATE_MAX_AGE + 1, -1])
+def test_read_tray_state_stale(monkeypatch, age):
+    # Negative age: a leftover file from an earlier boot
+    monkeypatch.setattr(shutdown, "read_state_file", lambda: tray_state(age=age))
+    assert shutdown.read_tray_state() is None
+
+
+def test_read_tray_state_missing(monkeypatch):
+    def missing():
+        raise FileNotFoundError()
+
+    monkeypatch.setattr(shutdown, "read_state_file", missing)
+    assert shutdown.read_tray_state() is None
+
+
+def test_tray_reading_counted_once(monkeypatch):
+    state = tray_state()
+    monkeypatch.setattr(shutdown, "read_state_file", lambda: state)
+    source = shutdown.BatterySource()
+    assert source.read() == (11.4, 45.0, False)
+    assert source.read() is None
+
+
+class FakeINA219:
+    """INA219 reader returning a fixed discharge reading."""
+
+    def read_all(self):
+        return 11.4, -800.0, 11.4 * 800.0
+
+
+@pytest.fixture
+def fallback(monkeypatch, data_dir):
+    """
+    A BatterySource on a fake clock and sensor.
+
+    Yields (source, clock, state): set state[0] to a tray state dict (or None
+    for no tray) and advance clock[0] to move BatteryLearning's time.
+    """
+    clock = [1_000_000.0]
+    monkeypatch.setitem(BatteryLearning.record_sample.__kwdefaults__, "_now", lambda: clock[0])
+    monkeypatch.setattr(shutdown, "get_ina219_reader", FakeINA219)
+
+    state = [None]
+
+    def read_state_file():
+        if state[0] is None:
+            raise FileNotFoundError()
+        return state[0]
+
+    monkeypatch.setattr(shutdown, "read_state_file", read_state_file)
+    source = shutdown.BatterySource()
+    try:
+        yield source, clock, state
+    finally:
+        source.close()
+
+
+def test_fallback_after_tray_gap_keeps_soc(fallback):
+    """Falling back again after a long spell on tray state must not count the gap."""
+    source, clock, state = fallback
+
+    # Daemon starts before the tray
+    voltage, percent, _ = source.read()
+    assert percent == pytest.approx(45, abs=1)
+
+    # Tray runs for 5 hours, then quits
+    state[0] = tray_state(percent=44.0)
+    assert source.read() == (11.4, 44.0, False)
+    clock[0] += 5 * 3600
+    state[0] = None
+
+    _, percent, _ = source.read()
+    assert percent == pytest.approx(44, abs=1)
+    assert percent > shutdown.SHUTDOWN_PERCENT
+
+
+def test_fallback_does_not_overwrite_tray_learning(fallback, data_dir):
+    """The boot-time fallback must not save its stale snapshot over the tray's data."""
+    source, clock, state = fallback
+
+    # Daemon starts before the tray, then the tray takes over
+    source.read()
+    state[0] = tray_state()
+    source.read()
+
+    # The tray discharges for 4 hours and saves on exit
+    tray = BatteryLearning()
+    for _ in range(4 * 60):
+        clock[0] += 60
+        tray.record_sample(11.4, -800.0, 11.4 * 800.0)
+    tray.close()
+    saved = json.loads((data_dir / "learned_data.json").read_text())
+    assert saved["total_discharge_mah"] == pytest.approx(3200, rel=0.01)
+
+    # Shutdown daemon exits
+    source.close()
+    assert json.loads((data_dir / "learned_data.json").read_text()) == saved
+
+    # A later fallback spell continues from the tray's data
+    state[0] = None
+    clock[0] += 60
+    source.read()
+    source.close()
+    saved_after = json.loads((data_dir / "learned_data.json").read_text())
+    assert saved_after["total_discharge_mah"] >= saved["total_discharge_mah"]